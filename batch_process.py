@@ -3,28 +3,147 @@ import json
 import asyncio
 import aiohttp
 import aiofiles
+import httpx
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional
 import uuid
+from fractions import Fraction
+import random
+import time
 import mimetypes
+import contextlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def env_number(name: str, default, cast=int, minimum=None):
+    raw = os.getenv(name)
+    if raw is None:
+        value = default
+    else:
+        try:
+            value = cast(raw)
+        except ValueError:
+            raise SystemExit(f"❌ Invalid {name}={raw!r}: expected a number") from None
+    if minimum is not None:
+        value = max(minimum, value)
+    return value
 
 API_URL = "https://api.topazlabs.com/video/"
 API_EXPRESS_URL = "https://api.topazlabs.com/video/express"
+API_CREDITS_URL = "https://api.topazlabs.com/account/v1/credits/balance"
 KEY_FILE = "key.txt"
 INPUT_FOLDER = "input"
 OUTPUT_FOLDER = "output"
 LOG_FILE = "processing_log.json"
-MAX_CONCURRENT_TASKS = 5
-RETRY_LIMIT = 1
+RESULTS_LOG_FILE = LOG_FILE + "l"
+MAX_CONCURRENT_TASKS = env_number('TOPAZ_CONCURRENCY', min(32, (os.cpu_count() or 4) * 4), minimum=1)
+RETRY_LIMIT = env_number('TOPAZ_RETRY_LIMIT', 1, minimum=0)
+RETRY_MAX_BACKOFF = 300
+JOB_CONCURRENCY = 32
+DISK_WRITERS = 2
+DOWNLOAD_QUEUE_SIZE = 4
+PROBE_CONCURRENCY = os.cpu_count() or 4
+PROBE_TIMEOUT = 30
+UPLOAD_CHUNK_SIZE = 4 << 20
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+READ_BUFSIZE = 10 * 1024 * 1024
+MIN_POLL_INTERVAL = 0.5
+POLL_INITIAL_INTERVAL = env_number('TOPAZ_POLL_INTERVAL', 2.0, float, minimum=MIN_POLL_INTERVAL)
+POLL_MAX_INTERVAL = env_number('TOPAZ_POLL_MAX_INTERVAL', 60.0, float, minimum=POLL_INITIAL_INTERVAL)
+CREDITS_PER_MINUTE = env_number('TOPAZ_CREDITS_PER_MINUTE', 0.0, float, minimum=0.0)
+
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v'})
+
+def json_loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def json_dumps(obj, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
+def dumps_line(obj: Dict) -> str:
+    return json_dumps(obj) + "\n"
+
+def format_ts(ts_ns: int) -> str:
+    return datetime.fromtimestamp(ts_ns / 1e9).isoformat()
+
+def parse_frame_rate(value: str, default: float = 24.0) -> float:
+    try:
+        return float(Fraction(value))
+    except (ValueError, ZeroDivisionError):
+        return default
+
+def create_connector() -> aiohttp.TCPConnector:
+    return aiohttp.TCPConnector(
+        limit=MAX_CONCURRENT_TASKS * 4,
+        limit_per_host=MAX_CONCURRENT_TASKS * 4,
+        ttl_dns_cache=300,
+        keepalive_timeout=75
+    )
+
+def create_session(connector: Optional[aiohttp.TCPConnector] = None) -> aiohttp.ClientSession:
+    timeout = aiohttp.ClientTimeout(
+        total=7200,
+        connect=60,
+        sock_read=300
+    )
+    return aiohttp.ClientSession(
+        connector=connector or create_connector(),
+        timeout=timeout,
+        read_bufsize=READ_BUFSIZE
+    )
+
+def create_api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        timeout=httpx.Timeout(7200, connect=60, read=300)
+    )
 
-VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v'}
+class APIError(Exception):
+    def __init__(self, status: int, text: str):
+        super().__init__(f"API error: {status} - {text}")
+        self.status = status
+        self.text = text
+
+async def get_balance(client: httpx.AsyncClient, api_key: str) -> Dict:
+    response = await client.get(API_CREDITS_URL, headers={'X-API-Key': api_key})
+    if response.status_code != 200:
+        raise APIError(response.status_code, response.text)
+    return json_loads(response.content)
 
 class VideoProcessor:
     def __init__(self):
         self.api_key = self.load_api_key()
+        self._post_headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'X-API-Key': self.api_key
+        }
+        self._get_headers = {
+            'Accept': 'application/json',
+            'X-API-Key': self.api_key
+        }
         self.session: Optional[aiohttp.ClientSession] = None
-        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+        self.api_client: Optional[httpx.AsyncClient] = None
+        self._connector = create_connector()
+        self._effective = self.effective_concurrency()
+        self.upload_semaphore = asyncio.Semaphore(self._effective)
+        self.job_semaphore = asyncio.Semaphore(JOB_CONCURRENCY)
+        self.probe_semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+        self.disk_semaphore = asyncio.BoundedSemaphore(DISK_WRITERS)
+        self.video_info: Dict[Path, Dict] = {}
+        self._ffprobe_missing = False
+        self._done = frozenset()
+        self._log_fh = None
+        self._log_lock = asyncio.Lock()
         self.log_data = {
             "start_time": datetime.now().isoformat(),
             "end_time": None,
@@ -41,33 +160,45 @@ class VideoProcessor:
             raise FileNotFoundError(f"API key file not found: {KEY_FILE}")
         return key_path.read_text().strip()
     
+    def effective_concurrency(self) -> int:
+        if 'TOPAZ_CONCURRENCY' in os.environ:
+            return MAX_CONCURRENT_TASKS
+        return min(MAX_CONCURRENT_TASKS, max(4, (os.cpu_count() or 4) // 2))
+    
     def ensure_folders(self):
         Path(INPUT_FOLDER).mkdir(exist_ok=True)
         Path(OUTPUT_FOLDER).mkdir(exist_ok=True)
     
     def get_video_files(self) -> List[Path]:
-        input_path = Path(INPUT_FOLDER)
         video_files = []
-        for file in input_path.iterdir():
-            if file.is_file() and file.suffix.lower() in VIDEO_EXTENSIONS:
-                video_files.append(file)
+        with os.scandir(INPUT_FOLDER) as entries:
+            for entry in entries:
+                stem, dot, ext = entry.name.rpartition('.')
+                if stem and '.' + ext.lower() in VIDEO_EXTENSIONS and entry.is_file():
+                    video_files.append(Path(entry.path))
         return sorted(video_files)
     
     def is_already_processed(self, input_file: Path) -> bool:
-        output_file = Path(OUTPUT_FOLDER) / input_file.name
-        return output_file.exists()
+        return input_file.name in self._done
     
     async def get_video_info(self, file_path: Path) -> Optional[Dict]:
         try:
-            import subprocess
-            result = subprocess.run(
-                ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', str(file_path)],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            if result.returncode == 0:
-                data = json.loads(result.stdout)
+            if self._ffprobe_missing:
+                raise FileNotFoundError('ffprobe')
+            async with self.probe_semaphore:
+                proc = await asyncio.create_subprocess_exec(
+                    'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', str(file_path),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                try:
+                    stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=PROBE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    raise
+            if proc.returncode == 0:
+                data = json_loads(stdout)
                 video_stream = next((s for s in data.get('streams', []) if s['codec_type'] == 'video'), None)
                 if video_stream:
                     format_info = data.get('format', {})
@@ -76,13 +207,20 @@ class VideoProcessor:
                         'height': int(video_stream.get('height', 0)),
                         'duration': float(format_info.get('duration', 0)),
                         'size': int(format_info.get('size', 0)),
-                        'frame_rate': eval(video_stream.get('r_frame_rate', '24/1')),
+                        'frame_rate': parse_frame_rate(video_stream.get('r_frame_rate', '24/1')),
                         'frame_count': int(video_stream.get('nb_frames', 0))
                     }
+        except FileNotFoundError:
+            if not self._ffprobe_missing:
+                self._ffprobe_missing = True
+                print("Warning: ffprobe not found, using default video info for all files")
         except Exception as e:
             print(f"Warning: Could not get video info for {file_path.name}, using defaults: {e}")
         
-        file_size = file_path.stat().st_size
+        try:
+            file_size = file_path.stat().st_size
+        except OSError:
+            file_size = 0
         return {
             'width': 1920,
             'height': 1080,
@@ -93,12 +231,6 @@ class VideoProcessor:
         }
     
     async def submit_video_job(self) -> Dict:
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'X-API-Key': self.api_key
-        }
-        
         payload = {
             "source": {
                 "container": "mp4"
@@ -122,91 +254,144 @@ class VideoProcessor:
             }
         }
         
-        async with self.session.post(API_EXPRESS_URL, headers=headers, json=payload) as response:
-            response_data = await response.json()
-            if response.status != 200:
-                raise Exception(f"API error: {response.status} - {response_data}")
-            return response_data
+        response = await self.api_client.post(API_EXPRESS_URL, headers=self._post_headers, content=json_dumps(payload))
+        response_data = json_loads(response.content)
+        if response.status_code != 200:
+            raise Exception(f"API error: {response.status_code} - {response_data}")
+        return response_data
     
-    async def upload_video(self, file_path: Path, upload_url: str) -> bool:
+    async def _file_sender(self, file_path: Path, offset: int, length: int, chunk_size: int = UPLOAD_CHUNK_SIZE):
         async with aiofiles.open(file_path, 'rb') as f:
-            video_data = await f.read()
-        
-        headers = {'Content-Type': 'video/mp4'}
-        async with self.session.put(upload_url, data=video_data, headers=headers) as response:
-            return response.status in [200, 201, 204]
-    
-    async def check_job_status(self, request_id: str) -> Dict:
+            await f.seek(offset)
+            remaining = length
+            while remaining > 0 and (chunk := await f.read(min(chunk_size, remaining))):
+                remaining -= len(chunk)
+                yield chunk
+
+    async def _put_range(self, upload_url: str, file_path: Path, offset: int, length: int) -> Optional[str]:
         headers = {
-            'Accept': 'application/json',
-            'X-API-Key': self.api_key
+            'Content-Type': 'video/mp4',
+            'Content-Length': str(length)
         }
+        data = self._file_sender(file_path, offset, length)
+        async with self.session.put(upload_url, data=data, headers=headers) as response:
+            if response.status not in [200, 201, 204]:
+                return None
+            return response.headers.get('ETag', '')
+
+    async def upload_video(self, file_path: Path, upload_urls: List[str]) -> Optional[List[Dict]]:
+        file_size = file_path.stat().st_size
+        part_count = len(upload_urls)
+        if part_count > 1 and file_size < part_count:
+            raise Exception(f"Cannot split {file_size} bytes into {part_count} upload parts")
         
+        bounds = [file_size * i // part_count for i in range(part_count + 1)]
+        etags = await asyncio.gather(*(
+            self._put_range(url, file_path, start, end - start)
+            for url, start, end in zip(upload_urls, bounds, bounds[1:])
+        ))
+        if any(etag is None for etag in etags):
+            return None
+        if part_count > 1 and not all(etags):
+            raise Exception("Upload part response is missing an ETag")
+        return [{"partNum": num, "eTag": etag} for num, etag in enumerate(etags, start=1)]
+    
+    async def complete_upload(self, request_id: str, upload_results: List[Dict]):
+        url = f"{API_URL}{request_id}/complete-upload/"
+        payload = {"uploadResults": upload_results}
+        response = await self.api_client.patch(url, headers=self._post_headers, content=json_dumps(payload))
+        if response.status_code != 200:
+            raise Exception(f"Complete upload failed: {response.status_code} - {response.text}")
+    
+    async def check_job_status(self, request_id: str) -> Dict:
         url = f"{API_URL}{request_id}/status"
-        async with self.session.get(url, headers=headers) as response:
-            if response.status != 200:
-                raise Exception(f"Status check failed: {response.status}")
-            return await response.json()
+        response = await self.api_client.get(url, headers=self._get_headers)
+        if response.status_code != 200:
+            raise Exception(f"Status check failed: {response.status_code}")
+        status_data = json_loads(response.content)
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and 'retryAfter' not in status_data:
+            status_data['retryAfter'] = retry_after
+        return status_data
+    
+    def next_poll_delay(self, delay: float, status_response: Dict) -> float:
+        hint = status_response.get('retryAfter') or status_response.get('eta')
+        if hint:
+            try:
+                return min(POLL_MAX_INTERVAL, max(POLL_INITIAL_INTERVAL, float(hint)))
+            except (TypeError, ValueError):
+                pass
+        return min(POLL_MAX_INTERVAL, delay * 1.5 + random.uniform(0, delay * 0.1))
+    
+    async def _write_chunks(self, queue: asyncio.Queue, temp_file: Path):
+        async with aiofiles.open(temp_file, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+            while (chunk := await queue.get()) is not None:
+                await f.write(chunk)
+    
+    async def _put_or_writer_failed(self, queue: asyncio.Queue, chunk, writer: asyncio.Task) -> bool:
+        put = asyncio.ensure_future(queue.put(chunk))
+        try:
+            await asyncio.wait({put, writer}, return_when=asyncio.FIRST_COMPLETED)
+            return not writer.done()
+        finally:
+            if not put.done():
+                put.cancel()
     
     async def download_result(self, download_url: str, temp_file: Path) -> bool:
-        async with self.session.get(download_url) as response:
+        async with self.disk_semaphore, self.session.get(download_url) as response:
             if response.status != 200:
                 return False
             
-            async with aiofiles.open(temp_file, 'wb') as f:
-                async for chunk in response.content.iter_chunked(8192):
-                    await f.write(chunk)
+            queue = asyncio.Queue(maxsize=DOWNLOAD_QUEUE_SIZE)
+            writer = asyncio.create_task(self._write_chunks(queue, temp_file))
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    if not await self._put_or_writer_failed(queue, chunk, writer):
+                        break
+                else:
+                    await self._put_or_writer_failed(queue, None, writer)
+            except BaseException:
+                writer.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await writer
+                raise
+            await writer
             return True
     
-    async def process_single_video(self, input_file: Path, retry_count: int = 0) -> Dict:
-        result = {
-            "filename": input_file.name,
-            "status": "unknown",
-            "request_id": None,
-            "error": None,
-            "retry_count": retry_count,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        try:
-            if self.is_already_processed(input_file):
-                result["status"] = "skipped"
-                result["error"] = "Already processed"
-                self.log_data["skipped"] += 1
-                print(f"⏭️  Skipped: {input_file.name} (already processed)")
-                return result
-            
-            print(f"🎬 Processing: {input_file.name}")
-            
-            job_response = await self.submit_video_job()
-            request_id = job_response.get('requestId')
-            upload_urls = job_response.get('uploadUrls', [])
-            result["request_id"] = request_id
-            
-            if not request_id:
-                raise Exception("No request ID received from API")
-            if not upload_urls or len(upload_urls) == 0:
-                raise Exception("No upload URLs received from API")
-            
-            upload_url = upload_urls[0]
-            
-            print(f"   ✓ Job created: {request_id}")
-            
-            print(f"   ⬆️  Uploading video...")
-            if not await self.upload_video(input_file, upload_url):
-                raise Exception("Video upload failed")
-            print(f"   ✓ Upload complete, processing started")
+    async def run_video_job(self, input_file: Path, result: Dict):
+        async with self.job_semaphore:
+            async with self.upload_semaphore:
+                job_response = await self.submit_video_job()
+                request_id = job_response.get('requestId')
+                upload_urls = job_response.get('uploadUrls', [])
+                result["request_id"] = request_id
+                
+                if not request_id:
+                    raise Exception("No request ID received from API")
+                if not upload_urls or len(upload_urls) == 0:
+                    raise Exception("No upload URLs received from API")
+                
+                print(f"   ✓ Job created: {request_id}")
+                
+                print(f"   ⬆️  Uploading video ({len(upload_urls)} part(s))...")
+                upload_results = await self.upload_video(input_file, upload_urls)
+                if upload_results is None:
+                    raise Exception("Video upload failed")
+                if len(upload_results) > 1:
+                    await self.complete_upload(request_id, upload_results)
+                print(f"   ✓ Upload complete, processing started")
             
             max_wait = 3600
-            wait_interval = 10
+            delay = POLL_INITIAL_INTERVAL
             elapsed = 0
             
             while elapsed < max_wait:
-                await asyncio.sleep(wait_interval)
-                elapsed += wait_interval
+                await asyncio.sleep(delay)
+                elapsed += delay
                 
                 status_response = await self.check_job_status(request_id)
                 status = status_response.get('status')
+                delay = self.next_poll_delay(delay, status_response)
                 
                 if status == 'complete':
                     download_url = status_response.get('download', {}).get('url')
@@ -218,18 +403,15 @@ class VideoProcessor:
                     final_file = Path(OUTPUT_FOLDER) / input_file.name
                     
                     print(f"   ⬇️  Downloading result...")
-                    if await self.download_result(download_url, temp_file):
-                        temp_file.rename(final_file)
-                        result["status"] = "success"
-                        self.log_data["successful"] += 1
-                        print(f"   ✅ Success: {input_file.name}")
-                        return result
-                    else:
+                    downloaded = await self.download_result(download_url, temp_file)
+                    if not downloaded:
                         raise Exception("Download failed")
+                    temp_file.rename(final_file)
+                    return
                 
                 elif status == 'failed':
                     error_msg = status_response.get('error', 'Unknown error')
-                    print(f"   🔍 Full API response: {json.dumps(status_response, indent=2)}")
+                    print(f"   🔍 Full API response: {json_dumps(status_response, indent=True)}")
                     raise Exception(f"Job failed: {error_msg}")
                 
                 elif status in ['requested', 'accepted', 'initializing', 'preprocessing', 'processing', 'postprocessing']:
@@ -239,27 +421,89 @@ class VideoProcessor:
                     print(f"   ℹ️  Status: {status}")
             
             raise Exception(f"Timeout after {max_wait}s")
-            
-        except Exception as e:
-            error_msg = str(e)
-            print(f"   ❌ Error: {input_file.name} - {error_msg}")
-            
-            if retry_count < RETRY_LIMIT:
-                print(f"   🔄 Retrying ({retry_count + 1}/{RETRY_LIMIT})...")
-                await asyncio.sleep(5)
-                return await self.process_single_video(input_file, retry_count + 1)
-            
-            result["status"] = "failed"
-            result["error"] = error_msg
-            self.log_data["failed"] += 1
+    
+    async def process_single_video(self, input_file: Path) -> Dict:
+        result = {
+            "filename": input_file.name,
+            "status": "unknown",
+            "request_id": None,
+            "error": None,
+            "retry_count": 0,
+            "ts_ns": time.time_ns()
+        }
+        
+        if self.is_already_processed(input_file):
+            result["status"] = "skipped"
+            result["error"] = "Already processed"
+            self.log_data["skipped"] += 1
+            print(f"⏭️  Skipped: {input_file.name} (already processed)")
             return result
+        
+        print(f"🎬 Processing: {input_file.name}")
+        
+        for attempt in range(RETRY_LIMIT + 1):
+            result["retry_count"] = attempt
+            try:
+                await self.run_video_job(input_file, result)
+                result["status"] = "success"
+                self.log_data["successful"] += 1
+                print(f"   ✅ Success: {input_file.name}")
+                return result
+            except Exception as e:
+                error_msg = str(e)
+                print(f"   ❌ Error: {input_file.name} - {error_msg}")
+                
+                if attempt < RETRY_LIMIT:
+                    print(f"   🔄 Retrying ({attempt + 1}/{RETRY_LIMIT})...")
+                    await asyncio.sleep(min(RETRY_MAX_BACKOFF, 5 * 2 ** attempt))
+        
+        result["status"] = "failed"
+        result["error"] = error_msg
+        self.log_data["failed"] += 1
+        return result
+    
+    async def process_and_log_video(self, input_file: Path) -> Dict:
+        result = await self.process_single_video(input_file)
+        await self.append_result(result)
+        return result
     
-    async def process_video_with_semaphore(self, input_file: Path) -> Dict:
-        async with self.semaphore:
-            return await self.process_single_video(input_file)
+    async def append_result(self, result: Dict):
+        async with self._log_lock:
+            await self._log_fh.write(dumps_line(result))
+            await self._log_fh.flush()
+    
+    def estimate_credits(self, video_files: List[Path]) -> float:
+        if not CREDITS_PER_MINUTE:
+            return 0.0
+        minutes = sum(self.video_info[video_file]['duration'] / 60 for video_file in video_files)
+        return minutes * CREDITS_PER_MINUTE
+    
+    async def has_enough_credits(self, video_files: List[Path]) -> bool:
+        try:
+            balance = await get_balance(self.api_client, self.api_key)
+        except Exception as e:
+            print(f"⚠️  Could not check credit balance, continuing: {e}")
+            return True
+        
+        available = balance.get('available_credits')
+        if available is None:
+            print("⚠️  Credit balance response has no available_credits, continuing")
+            return True
+        
+        estimated = self.estimate_credits(video_files)
+        print(f"💰 Available credits: {available:,}")
+        if CREDITS_PER_MINUTE:
+            print(f"🧮 Estimated cost:    {estimated:,.0f}")
+        
+        if available <= 0 or available < estimated:
+            print("❌ Insufficient credits, aborting before submitting any jobs")
+            print("💳 Add more credits at: https://topazlabs.com/my-account/subscriptions/")
+            return False
+        return True
     
     async def process_all_videos(self):
         self.ensure_folders()
+        self._done = frozenset(os.listdir(OUTPUT_FOLDER))
         
         video_files = self.get_video_files()
         self.log_data["total_videos"] = len(video_files)
@@ -269,32 +513,37 @@ class VideoProcessor:
             return
         
         print(f"📊 Found {len(video_files)} video(s) to process")
-        print(f"⚙️  Max concurrent tasks: {MAX_CONCURRENT_TASKS}")
+        print(f"⚙️  Stage limits: upload={self._effective}, jobs in flight={JOB_CONCURRENCY}, download={DISK_WRITERS}")
         print(f"🔄 Retry limit: {RETRY_LIMIT}")
         print("-" * 60)
         
-        timeout = aiohttp.ClientTimeout(
-            total=7200,
-            connect=60,
-            sock_read=300
-        )
-        async with aiohttp.ClientSession(timeout=timeout) as session:
+        pending = [video_file for video_file in video_files if not self.is_already_processed(video_file)]
+        if CREDITS_PER_MINUTE:
+            infos = await asyncio.gather(*(self.get_video_info(video_file) for video_file in pending))
+            self.video_info = dict(zip(pending, infos))
+        
+        async with create_session(self._connector) as session, \
+                create_api_client() as api_client, \
+                aiofiles.open(RESULTS_LOG_FILE, 'a', encoding='utf-8') as log_fh:
             self.session = session
+            self.api_client = api_client
+            self._log_fh = log_fh
             
-            tasks = [self.process_video_with_semaphore(video_file) for video_file in video_files]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for result in results:
-                if isinstance(result, Exception):
-                    self.log_data["results"].append({
-                        "filename": "unknown",
-                        "status": "failed",
-                        "error": str(result),
-                        "timestamp": datetime.now().isoformat()
-                    })
-                    self.log_data["failed"] += 1
-                else:
-                    self.log_data["results"].append(result)
+            if not pending or await self.has_enough_credits(pending):
+                tasks = [self.process_and_log_video(video_file) for video_file in video_files]
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                
+                for result in results:
+                    if isinstance(result, Exception):
+                        self.log_data["results"].append({
+                            "filename": "unknown",
+                            "status": "failed",
+                            "error": str(result),
+                            "ts_ns": time.time_ns()
+                        })
+                        self.log_data["failed"] += 1
+                    else:
+                        self.log_data["results"].append(result)
         
         self.log_data["end_time"] = datetime.now().isoformat()
         
@@ -302,8 +551,15 @@ class VideoProcessor:
         self.print_summary()
     
     async def save_log(self):
+        results = []
+        for result in self.log_data["results"]:
+            entry = {k: v for k, v in result.items() if k != "ts_ns"}
+            entry["timestamp"] = format_ts(result["ts_ns"])
+            results.append(entry)
+        log_data = {**self.log_data, "results": results}
+        
         async with aiofiles.open(LOG_FILE, 'w', encoding='utf-8') as f:
-            await f.write(json.dumps(self.log_data, indent=2, ensure_ascii=False))
+            await f.write(json_dumps(log_data, indent=True))
         print(f"\n📝 Log saved to: {LOG_FILE}")
     
     def print_summary(self):
@@ -314,6 +570,8 @@ class VideoProcessor:
         print(f"✅ Successful:    {self.log_data['successful']}")
         print(f"❌ Failed:        {self.log_data['failed']}")
         print(f"⏭️  Skipped:       {self.log_data['skipped']}")
+        print(f"⚙️  Concurrency:   {self._effective} (TOPAZ_CONCURRENCY)")
+        print(f"🔄 Retry limit:   {RETRY_LIMIT} (TOPAZ_RETRY_LIMIT)")
         print("=" * 60)
         
         if self.log_data['failed'] > 0:
@@ -1,8 +1,10 @@
-import requests
+import asyncio
+import httpx
 from pathlib import Path
 import sys
 
-API_CREDITS_URL = "https://api.topazlabs.com/account/v1/credits/balance"
+from batch_process import APIError, create_api_client, get_balance
+
 KEY_FILE = "key.txt"
 
 def load_api_key() -> str:
@@ -12,25 +14,15 @@ def load_api_key() -> str:
         sys.exit(1)
     return key_path.read_text().strip()
 
-def check_credits():
+async def check_credits():
     try:
         api_key = load_api_key()
         
-        headers = {
-            'X-API-Key': api_key
-        }
-        
         print("🔍 Checking credit balance...")
         print("-" * 50)
         
-        response = requests.get(API_CREDITS_URL, headers=headers)
-        
-        if response.status_code != 200:
-            print(f"❌ API Error: {response.status_code}")
-            print(f"Response: {response.text}")
-            sys.exit(1)
-        
-        data = response.json()
+        async with create_api_client() as client:
+            data = await get_balance(client, api_key)
         
         available = data.get('available_credits', 0)
         reserved = data.get('reserved_credits', 0)
@@ -48,7 +40,11 @@ def check_credits():
     except FileNotFoundError as e:
         print(f"❌ Error: {e}")
         sys.exit(1)
-    except requests.exceptions.RequestException as e:
+    except APIError as e:
+        print(f"❌ API Error: {e.status}")
+        print(f"Response: {e.text}")
+        sys.exit(1)
+    except httpx.HTTPError as e:
         print(f"❌ Network Error: {e}")
         sys.exit(1)
     except Exception as e:
@@ -56,4 +52,4 @@ def check_credits():
         sys.exit(1)
 
 if __name__ == "__main__":
-    check_credits()
+    asyncio.run(check_credits())